@@ -1,12 +1,37 @@
+# eventlet must patch the stdlib before anything else imports it
+try:
+    import eventlet
+    eventlet.monkey_patch()
+    ASYNC_MODE = "eventlet"
+except ImportError:
+    ASYNC_MODE = "threading"
+
+import atexit
+import json
 import os
+import queue
+import re
 import smtplib
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from decimal import Decimal
 from pathlib import Path
+from uuid import uuid4
 import secrets
+import orjson
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from cachetools import TTLCache
 from dotenv import load_dotenv
-from flask import Flask, g, render_template, request, redirect, url_for, flash, session, send_from_directory
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, g, render_template, request, redirect, url_for, flash, session, send_from_directory, abort, Response
+from flask.json.provider import JSONProvider
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.http import http_date
+from werkzeug.security import check_password_hash, safe_join
 from werkzeug.utils import secure_filename
 from email.message import EmailMessage
 import ssl
@@ -17,25 +42,96 @@ try:
 except Exception:
     OpenAI = None
 
+# --- Optional: Pillow (content check for uploaded images) ---
+try:
+    from PIL import Image
+except Exception:
+    Image = None
+
+# --- Optional: Redis (shared cache + Socket.IO message queue across workers) ---
+try:
+    from redis import Redis, RedisError
+except Exception:
+    Redis = None
+    class RedisError(Exception):
+        pass
+
 load_dotenv()
 
 BASE_DIR = Path(__file__).parent
 DB_PATH = BASE_DIR / "app.db"
+DB_READERS = int(os.getenv("DB_READERS", "4"))
+DB_CHECKOUT_TIMEOUT = 10  # seconds to wait for a free reader before failing the request
+DB_CACHED_STATEMENTS = 256
+SQLITE_MAX_INT = 2**63 - 1
+DB_MMAP_SIZE = 512 * 1024 * 1024  # read-heavy pages come straight from the OS page cache
+REDIS_URL = os.getenv("REDIS_URL")
+JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR")
 UPLOAD_DIR = BASE_DIR / "uploads"
 AVATAR_DIR = UPLOAD_DIR / "avatars"
 RECIPE_IMG_DIR = UPLOAD_DIR / "recipes"
+_IMG_EXT = frozenset((".png", ".jpg", ".jpeg", ".webp"))
 for d in [UPLOAD_DIR, AVATAR_DIR, RECIPE_IMG_DIR]:
     d.mkdir(parents=True, exist_ok=True)
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY","dev-secret")
 app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB files
+# Behind nginx, let it stream uploads itself (see nginx.conf)
+app.config["USE_X_ACCEL_REDIRECT"] = os.getenv("USE_X_ACCEL_REDIRECT", "0") == "1"
+# Compiled templates survive worker restarts instead of being re-parsed. Without
+# JINJA_CACHE_DIR, Jinja uses a per-user 0700 temp dir and verifies its owner.
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory=JINJA_CACHE_DIR)
+
+# --- JSON: orjson for Flask responses and Socket.IO packets ---
+# Same extra types as Flask's DefaultJSONProvider (orjson handles UUID and dataclasses
+# natively); anything else raises TypeError instead of being stringified.
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+def _orjson_default(o):
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, Decimal):
+        return str(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def _orjson_dumps(obj, option=_ORJSON_OPTIONS):
+    return orjson.dumps(obj, default=_orjson_default, option=option).decode()
+
+class OrjsonProvider(JSONProvider):
+    # Like DefaultJSONProvider: sorted keys, and response bodies end with a newline
+    def dumps(self, obj, **kwargs):
+        return _orjson_dumps(obj, _ORJSON_OPTIONS | orjson.OPT_SORT_KEYS)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(f"{self.dumps(obj)}\n", mimetype="application/json")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+class OrjsonWrapper:
+    """Stand-in for the stdlib json module; socketio passes e.g. separators=, which orjson ignores."""
+
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        return _orjson_dumps(obj)
+
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return orjson.loads(s)
+
+app.json = OrjsonProvider(app)
 
 # --- SocketIO ---
 from flask_socketio import SocketIO, join_room, emit
 
-# Force threading mode to avoid eventlet compatibility issues with Python 3.13
-socketio = SocketIO(app, async_mode="threading", cors_allowed_origins="*")
+# eventlet multiplexes the long-lived sockets on one thread; threading is the fallback
+# when eventlet isn't installed (e.g. Python 3.13 dev setups)
+socketio = SocketIO(app, async_mode=ASYNC_MODE, cors_allowed_origins="*", message_queue=REDIS_URL,
+                    json=OrjsonWrapper)
 
 # ---------- Email / OTP ----------
 def send_otp_email(to_email: str, otp_code: str):
@@ -56,23 +152,87 @@ def send_otp_email(to_email: str, otp_code: str):
         server.send_message(msg)
 
 def generate_otp():
-    return f"{secrets.randbelow(1000000):06d}"
+    # One 32-bit read folded to 6 digits; modulo bias is ~0.02%, fine for an OTP
+    return f"{int.from_bytes(secrets.token_bytes(4), 'little') % 1000000:06d}"
 
 # ---------- DB helpers ----------
+class ConnectionPool:
+    """Long-lived SQLite connections: one lock-guarded writer + N readers (WAL)."""
+
+    def __init__(self, path, readers=DB_READERS):
+        self._readers = queue.Queue()
+        for _ in range(readers):
+            self._readers.put(self._connect(path))
+        self._writer = self._connect(path)
+        self._write_lock = threading.RLock()
+
+    @staticmethod
+    def _connect(path):
+        # Connections live for the whole process, so sqlite3's per-connection
+        # prepared-statement cache stays warm across requests
+        conn = sqlite3.connect(path, check_same_thread=False, cached_statements=DB_CACHED_STATEMENTS)
+        conn.row_factory = sqlite3.Row
+        # page_size only applies to a brand-new file and must precede the switch to WAL
+        conn.execute("PRAGMA page_size=8192")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=-20000")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def checkout_read(self, timeout=DB_CHECKOUT_TIMEOUT):
+        try:
+            return self._readers.get(timeout=timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("timed out waiting for a pooled read connection") from None
+
+    def checkin_read(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._readers.put(conn)
+
+    def checkout_write(self):
+        self._write_lock.acquire()
+        return self._writer
+
+    def checkin_write(self, conn):
+        # Never hand an open transaction to the next writer
+        if conn.in_transaction:
+            conn.rollback()
+        self._write_lock.release()
+
+pool = ConnectionPool(DB_PATH)
+
 def get_db():
     if "db" not in g:
-        g.db = sqlite3.connect(DB_PATH)
-        g.db.row_factory = sqlite3.Row
+        g.db = pool.checkout_read()
     return g.db
 
-@app.teardown_appcontext
-def close_db(error=None):
+def get_write_db():
+    if "write_db" not in g:
+        g.write_db = pool.checkout_write()
+    return g.write_db
+
+# Hand connections back early before slow non-DB work (SMTP, password hashing);
+# get_db()/get_write_db() check out again if the request needs them later.
+def release_db():
     db = g.pop("db", None)
     if db is not None:
-        db.close()
+        pool.checkin_read(db)
+
+def release_write_db():
+    write_db = g.pop("write_db", None)
+    if write_db is not None:
+        pool.checkin_write(write_db)
+
+@app.teardown_appcontext
+def close_db(error=None):
+    release_db()
+    release_write_db()
 
 def init_db():
-    db = get_db()
+    db = get_write_db()
     db.executescript(
         """
         CREATE TABLE IF NOT EXISTS users (
@@ -85,14 +245,14 @@ def init_db():
             is_verified INTEGER NOT NULL DEFAULT 0,
             otp_code TEXT,
             otp_expires TEXT,
-            created_at TEXT NOT NULL
+            created_at INTEGER NOT NULL
         );
         CREATE TABLE IF NOT EXISTS blogs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
             title TEXT NOT NULL,
             content TEXT NOT NULL,
-            created_at TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
             FOREIGN KEY (user_id) REFERENCES users(id)
         );
         CREATE TABLE IF NOT EXISTS recipes (
@@ -103,7 +263,7 @@ def init_db():
             ingredients TEXT NOT NULL,
             steps TEXT NOT NULL,
             image_url TEXT,
-            created_at TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
             FOREIGN KEY (user_id) REFERENCES users(id)
         );
         CREATE TABLE IF NOT EXISTS groups (
@@ -113,7 +273,7 @@ def init_db():
             is_public INTEGER NOT NULL DEFAULT 1,
             owner_id INTEGER NOT NULL,
             invite_code TEXT,
-            created_at TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
             FOREIGN KEY (owner_id) REFERENCES users(id)
         );
         CREATE TABLE IF NOT EXISTS group_members (
@@ -130,10 +290,15 @@ def init_db():
             group_id INTEGER NOT NULL,
             user_id INTEGER NOT NULL,
             content TEXT NOT NULL,
-            created_at TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
             FOREIGN KEY (group_id) REFERENCES groups(id),
             FOREIGN KEY (user_id) REFERENCES users(id)
         );
+        CREATE INDEX IF NOT EXISTS idx_blogs_user ON blogs(user_id, id DESC);
+        CREATE INDEX IF NOT EXISTS idx_recipes_user ON recipes(user_id, id DESC);
+        CREATE INDEX IF NOT EXISTS idx_messages_group ON messages(group_id, id);
+        CREATE INDEX IF NOT EXISTS idx_gm_user ON group_members(user_id, group_id);
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_groups_invite ON groups(invite_code) WHERE invite_code IS NOT NULL;
         """
     )
     db.commit()
@@ -141,18 +306,113 @@ def init_db():
 with app.app_context():
     init_db()
 
+# ---------- Template helpers ----------
+@app.template_filter("fmt_ts")
+def fmt_ts(value):
+    """Format a created_at value (UNIX ms, or a legacy ISO string) as UTC 'YYYY-MM-DD HH:MM'."""
+    if value is None or value == "":
+        return ""
+    try:
+        ms = int(value)
+    except (TypeError, ValueError):
+        return str(value)[:16].replace("T", " ")
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime("%Y-%m-%d %H:%M")
+
 # ---------- Auth helpers ----------
+# Short-lived user cache so load_user doesn't hit SQLite on every request.
+# Redis when REDIS_URL is set (shared by all workers), otherwise per-process.
+USER_CACHE_TTL = 60
+USER_CACHE = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL)
+USER_CACHE_LOCK = threading.Lock()
+# Short timeouts so a hung Redis degrades to the local cache instead of stalling requests
+REDIS_TIMEOUT = 0.1  # seconds
+redis_client = (
+    Redis.from_url(REDIS_URL, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT)
+    if REDIS_URL and Redis is not None else None
+)
+
+# Only what g.user consumers read; never hashes or OTPs
+USER_CACHE_COLUMNS = "id, username"
+
+# If Redis is unreachable, fall back to the in-process cache instead of failing requests
+def _cache_get_user(uid):
+    if redis_client is not None:
+        try:
+            data = redis_client.get(f"u:{uid}")
+            return json.loads(data) if data else None
+        except RedisError:
+            app.logger.warning("Redis unavailable; using the in-process user cache")
+    with USER_CACHE_LOCK:
+        return USER_CACHE.get(uid)
+
+def _cache_set_user(uid, user):
+    if redis_client is not None:
+        try:
+            redis_client.setex(f"u:{uid}", USER_CACHE_TTL, json.dumps(user))
+            return
+        except RedisError:
+            app.logger.warning("Redis unavailable; using the in-process user cache")
+    with USER_CACHE_LOCK:
+        USER_CACHE[uid] = user
+
 def current_user():
     uid = session.get("user_id")
     if not uid:
         return None
-    db = get_db()
-    return db.execute("SELECT * FROM users WHERE id=?", (uid,)).fetchone()
+    user = _cache_get_user(uid)
+    if user is None:
+        db = get_db()
+        row = db.execute(f"SELECT {USER_CACHE_COLUMNS} FROM users WHERE id=?", (uid,)).fetchone()
+        if row is None:
+            return None
+        user = dict(row)
+        _cache_set_user(uid, user)
+    return user
+
+def invalidate_user(uid):
+    if redis_client is not None:
+        try:
+            redis_client.delete(f"u:{uid}")
+        except RedisError:
+            app.logger.warning("Redis unavailable; could not invalidate cached user %s", uid)
+    with USER_CACHE_LOCK:
+        USER_CACHE.pop(uid, None)
 
 @app.before_request
 def load_user():
     g.user = current_user()
 
+# argon2id for new hashes; older werkzeug (scrypt/pbkdf2) hashes are upgraded on login
+PASSWORD_HASHER = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
+# Hashing is CPU-heavy; run it on worker threads so the request thread (and, under
+# eventlet, the whole hub) isn't stalled. argon2/hashlib release the GIL while hashing.
+HASH_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+
+def submit_hash(fn, *args):
+    if ASYNC_MODE == "eventlet":
+        # Patched threads are green threads; tpool runs the call on a real OS thread
+        from eventlet import tpool
+        return HASH_POOL.submit(tpool.execute, fn, *args)
+    return HASH_POOL.submit(fn, *args)
+
+def hash_password(password):
+    return PASSWORD_HASHER.hash(password)
+
+def verify_password(stored_hash, password):
+    """Return (ok, new_hash); new_hash is set when the stored hash should be replaced."""
+    if stored_hash.startswith("$argon2"):
+        try:
+            PASSWORD_HASHER.verify(stored_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False, None
+        if PASSWORD_HASHER.check_needs_rehash(stored_hash):
+            return True, hash_password(password)
+        return True, None
+    if check_password_hash(stored_hash, password):
+        return True, hash_password(password)
+    return False, None
+
 def login_required(view):
     from functools import wraps
     @wraps(view)
@@ -177,27 +437,37 @@ def register():
         if not username or not email or not password:
             flash("All fields are required.")
             return redirect(url_for("register"))
-        db = get_db()
+        pw_future = submit_hash(hash_password, password)
+        # Duplicate check runs while the password is being hashed
+        exists = get_db().execute("SELECT 1 FROM users WHERE username=? OR email=?", (username, email)).fetchone()
+        release_db()
+        if exists:
+            flash("Username or email already exists.")
+            return redirect(url_for("register"))
+        pw_hash = pw_future.result()
+        db = get_write_db()
         try:
-            db.execute(
-                "INSERT INTO users (username,email,password_hash,bio,created_at) VALUES (?,?,?,?,?)",
-                (username, email, generate_password_hash(password), "", datetime.utcnow().isoformat())
-            )
+            user_id = db.execute(
+                "INSERT INTO users (username,email,password_hash,bio,created_at) VALUES (?,?,?,?,?) RETURNING id",
+                (username, email, pw_hash, "", int(time.time() * 1000))
+            ).fetchone()[0]
             db.commit()
         except sqlite3.IntegrityError:
             flash("Username or email already exists.")
             return redirect(url_for("register"))
-        # Fetch new user and set OTP
-        user = db.execute("SELECT * FROM users WHERE email=?", (email,)).fetchone()
+        # Set OTP on the new user
         otp = generate_otp()
         expires = (datetime.utcnow().timestamp() + 600)  # 10 minutes
-        db.execute("UPDATE users SET otp_code=?, otp_expires=? WHERE id=?", (otp, str(expires), user["id"]))
+        db.execute("UPDATE users SET otp_code=?, otp_expires=? WHERE id=?", (otp, str(expires), user_id))
         db.commit()
+        # Don't hold the writer through the SMTP round trip
+        release_write_db()
         try:
             send_otp_email(email, otp)
         except Exception as e:
             # Fail hard (as requested earlier): clean user and show error
-            db.execute("DELETE FROM users WHERE id=?", (user["id"],))
+            db = get_write_db()
+            db.execute("DELETE FROM users WHERE id=?", (user_id,))
             db.commit()
             flash("Failed to send OTP via Gmail. Set MAIL_USERNAME/MAIL_PASSWORD and allow 'App Passwords' for your account.")
             return redirect(url_for("register"))
@@ -228,8 +498,10 @@ def verify():
         if not code or code != (user["otp_code"] or "") or datetime.utcnow().timestamp() > expires_ts:
             flash("Invalid or expired OTP.")
             return redirect(url_for("verify"))
+        db = get_write_db()
         db.execute("UPDATE users SET is_verified=1, otp_code=NULL, otp_expires=NULL WHERE id=?", (user["id"],))
         db.commit()
+        invalidate_user(user["id"])
         session.pop("pending_email", None)
         flash("Email verified! You can now log in.")
         return redirect(url_for("login"))
@@ -242,7 +514,14 @@ def login():
         password = request.form["password"]
         db = get_db()
         user = db.execute("SELECT * FROM users WHERE email=?", (email,)).fetchone()
-        if user and check_password_hash(user["password_hash"], password):
+        release_db()
+        ok, new_hash = submit_hash(verify_password, user["password_hash"], password).result() if user else (False, None)
+        if ok:
+            if new_hash:
+                wdb = get_write_db()
+                wdb.execute("UPDATE users SET password_hash=? WHERE id=?", (new_hash, user["id"]))
+                wdb.commit()
+                invalidate_user(user["id"])
             if not user["is_verified"]:
                 session["pending_email"] = email
                 flash("Please verify your email before logging in.")
@@ -270,7 +549,6 @@ def profile(username):
 @app.route("/profile/edit", methods=["GET","POST"])
 @login_required
 def edit_profile():
-    db = get_db()
     user = g.user
     if request.method == "POST":
         bio = request.form.get("bio","").strip()
@@ -279,29 +557,58 @@ def edit_profile():
         if avatar and avatar.filename:
             fn = secure_filename(avatar.filename)
             ext = os.path.splitext(fn)[1].lower()
-            if ext not in [".png",".jpg",".jpeg",".webp"]:
+            if not is_valid_image(avatar, ext):
                 flash("Unsupported image type.")
                 return redirect(url_for("edit_profile"))
             avatar_name = f"user_{user['id']}{ext}"
             avatar.save(AVATAR_DIR / avatar_name)
-        if avatar_name:
-            db.execute("UPDATE users SET bio=?, avatar_url=? WHERE id=?", (bio, avatar_name, user["id"]))
-        else:
-            db.execute("UPDATE users SET bio=? WHERE id=?", (bio, user["id"]))
+        db = get_write_db()
+        # avatar_name is None when no new file was uploaded, keeping the current avatar
+        db.execute("UPDATE users SET bio=?, avatar_url=COALESCE(?, avatar_url) WHERE id=?",
+                   (bio, avatar_name, user["id"]))
         db.commit()
+        invalidate_user(user["id"])
         flash("Profile updated.")
         return redirect(url_for("profile", username=user["username"]))
     # GET
+    db = get_db()
     u = db.execute("SELECT * FROM users WHERE id=?", (user["id"],)).fetchone()
     return render_template("edit_profile.html", user=u)
 
+def is_valid_image(file, ext):
+    if ext not in _IMG_EXT:
+        return False
+    if Image is None:
+        return True
+    # Reject files that only pretend to be images by their extension
+    try:
+        with Image.open(file.stream) as img:
+            img.verify()
+    except Exception:
+        return False
+    finally:
+        file.stream.seek(0)
+    return True
+
+def send_upload(directory, internal_prefix, filename):
+    if not app.config["USE_X_ACCEL_REDIRECT"]:
+        return send_from_directory(directory, filename)
+    path = safe_join(str(directory), filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    resp = Response()
+    # nginx picks the Content-Type of the internal file when we don't set one
+    del resp.headers["Content-Type"]
+    resp.headers["X-Accel-Redirect"] = f"{internal_prefix}/{filename}"
+    return resp
+
 @app.get("/uploads/avatars/<path:filename>")
 def uploaded_avatar(filename):
-    return send_from_directory(AVATAR_DIR, filename)
+    return send_upload(AVATAR_DIR, "/_internal_avatars", filename)
 
 @app.get("/uploads/recipes/<path:filename>")
 def uploaded_recipe_image(filename):
-    return send_from_directory(RECIPE_IMG_DIR, filename)
+    return send_upload(RECIPE_IMG_DIR, "/_internal_recipes", filename)
 
 # ---------- Blogs ----------
 @app.get("/blogs")
@@ -319,9 +626,9 @@ def create_blog():
     if not title or not content:
         flash("Title and content are required.")
         return redirect(url_for("blogs"))
-    db = get_db()
+    db = get_write_db()
     db.execute("INSERT INTO blogs (user_id,title,content,created_at) VALUES (?,?,?,?)",
-               (g.user["id"], title, content, datetime.utcnow().isoformat()))
+               (g.user["id"], title, content, int(time.time() * 1000)))
     db.commit()
     flash("Blog published.")
     return redirect(url_for("blogs"))
@@ -346,16 +653,16 @@ def create_recipe():
     if photo and photo.filename:
         fn = secure_filename(photo.filename)
         ext = os.path.splitext(fn)[1].lower()
-        if ext not in [".png",".jpg",".jpeg",".webp"]:
+        if not is_valid_image(photo, ext):
             flash("Unsupported image type.")
             return redirect(url_for("recipes"))
         image_url = f"recipe_{g.user['id']}_{int(datetime.utcnow().timestamp())}{ext}"
         photo.save(RECIPE_IMG_DIR / image_url)
-    db = get_db()
+    db = get_write_db()
     db.execute("""
         INSERT INTO recipes (user_id,title,description,ingredients,steps,image_url,created_at)
         VALUES (?,?,?,?,?,?,?)
-    """, (g.user["id"], title, description, ingredients, steps, image_url, datetime.utcnow().isoformat()))
+    """, (g.user["id"], title, description, ingredients, steps, image_url, int(time.time() * 1000)))
     db.commit()
     flash("Recipe saved.")
     return redirect(url_for("recipes"))
@@ -365,15 +672,14 @@ def create_recipe():
 @login_required
 def groups():
     db = get_db()
-    rows = db.execute("SELECT * FROM groups ORDER BY id DESC").fetchall()
-    all_groups = []
-    for r in rows:
-        is_member = db.execute("SELECT 1 FROM group_members WHERE group_id=? AND user_id=?", (r["id"], g.user["id"])).fetchone()
-        owner_row = db.execute("SELECT username FROM users WHERE id=?", (r["owner_id"],)).fetchone()
-        d = dict(r)
-        d["is_member"] = bool(is_member)
-        d["owner_name"] = owner_row["username"] if owner_row else "Unknown"
-        all_groups.append(d)
+    all_groups = db.execute("""
+        SELECT groups.*, COALESCE(users.username, 'Unknown') AS owner_name,
+               (group_members.user_id IS NOT NULL) AS is_member
+        FROM groups
+        LEFT JOIN users ON users.id = groups.owner_id
+        LEFT JOIN group_members ON group_members.group_id = groups.id AND group_members.user_id = ?
+        ORDER BY groups.id DESC
+    """, (g.user["id"],)).fetchall()
     return render_template("groups.html", all_groups=all_groups, g=g)
 
 @app.post("/groups/create")
@@ -382,16 +688,15 @@ def create_group():
     name = request.form["name"].strip()
     description = request.form.get("description","").strip()
     is_public = 1 if request.form.get("is_public","1") == "1" else 0
-    db = get_db()
+    db = get_write_db()
     try:
         invite_code = None if is_public == 1 else secrets.token_urlsafe(8)
-        db.execute("INSERT INTO groups (name,description,is_public,owner_id,invite_code,created_at) VALUES (?,?,?,?,?,?)",
-                   (name, description, is_public, g.user["id"], invite_code, datetime.utcnow().isoformat()))
-        db.commit()
+        gid = db.execute("INSERT INTO groups (name,description,is_public,owner_id,invite_code,created_at) VALUES (?,?,?,?,?,?) RETURNING id",
+                         (name, description, is_public, g.user["id"], invite_code, int(time.time() * 1000))).fetchone()[0]
     except sqlite3.IntegrityError:
         flash("A group with that name already exists.")
         return redirect(url_for("groups"))
-    gid = db.execute("SELECT id FROM groups WHERE name=?", (name,)).fetchone()["id"]
+    # Group row and owner membership are committed together
     db.execute("INSERT OR IGNORE INTO group_members (group_id,user_id,role) VALUES (?,?,?)",
                (gid, g.user["id"], "owner"))
     db.commit()
@@ -404,7 +709,7 @@ def create_group():
 @app.post("/groups/join/<int:group_id>")
 @login_required
 def join_group(group_id):
-    db = get_db()
+    db = get_write_db()
     grp = db.execute("SELECT * FROM groups WHERE id=?", (group_id,)).fetchone()
     if not grp:
         flash("Group not found."); return redirect(url_for("groups"))
@@ -424,7 +729,7 @@ def join_by_code():
     if not code_str:
         flash("Invite code required.")
         return redirect(url_for("groups"))
-    db = get_db()
+    db = get_write_db()
     grp = db.execute("SELECT * FROM groups WHERE invite_code=?", (code_str,)).fetchone()
     if not grp:
         flash("Invalid invite code.")
@@ -446,13 +751,60 @@ def enter_group(group_id):
     if not m:
         flash("Join the group first.")
         return redirect(url_for("groups"))
-    messages = db.execute("""
-        SELECT messages.*, users.username FROM messages
+    cur = db.cursor()
+    cur.row_factory = None
+    messages = cur.execute("""
+        SELECT users.username, messages.content, messages.created_at FROM messages
         JOIN users ON users.id = messages.user_id
-        WHERE group_id=? ORDER BY id ASC
+        WHERE group_id=? ORDER BY messages.id ASC
     """,(group_id,)).fetchall()
     return render_template("group_room.html", group=grp, messages=messages)
 
+# Chat messages are committed in batches: one WAL fsync per flush instead of per message.
+# A single FIFO queue keeps insert order (and therefore per-room order) intact.
+MSG_QUEUE = deque()
+MSG_FLUSH_INTERVAL = 0.05  # seconds
+MSG_INSERT_SQL = "INSERT INTO messages (group_id,user_id,content,created_at) VALUES (?,?,?,?)"
+
+def flush_pending_messages():
+    batch = []
+    while MSG_QUEUE:
+        batch.append(MSG_QUEUE.popleft())
+    if not batch:
+        return
+    db = pool.checkout_write()
+    try:
+        db.executemany(MSG_INSERT_SQL, batch)
+        db.commit()
+    except sqlite3.OperationalError:
+        # Transient (e.g. database is locked): these were already broadcast, so put
+        # the batch back in front and retry it on the next flush
+        MSG_QUEUE.extendleft(reversed(batch))
+        raise
+    except Exception:
+        # Anything else is a bad row; store the rest one by one so it can't block the queue
+        db.rollback()
+        for row in batch:
+            try:
+                db.execute(MSG_INSERT_SQL, row)
+            except Exception:
+                app.logger.exception("Dropping chat message that cannot be stored: %r", row)
+        db.commit()
+    finally:
+        pool.checkin_write(db)
+
+def flush_messages():
+    while True:
+        socketio.sleep(MSG_FLUSH_INTERVAL)
+        try:
+            flush_pending_messages()
+        except Exception:
+            app.logger.exception("Failed to flush chat messages")
+
+socketio.start_background_task(flush_messages)
+# Don't drop whatever is still queued when the worker shuts down
+atexit.register(flush_pending_messages)
+
 @socketio.on("join")
 def on_join(data):
     room = data.get("room")
@@ -471,39 +823,43 @@ def on_message(data):
     if not user_id:
         return
     
-    # Get a new database connection for this thread
-    db = sqlite3.connect(DB_PATH)
-    db.row_factory = sqlite3.Row
-    
-    # Get user info from database
-    user = db.execute("SELECT * FROM users WHERE id=?", (user_id,)).fetchone()
-    if not user:
-        db.close()
-        return
-    
     # room format: group_<id>
     try:
         gid = int(room.split("_")[1])
     except Exception:
-        db.close()
         return
+    if not 0 < gid <= SQLITE_MAX_INT:
+        return
+    room = f"group_{gid}"
     
-    # Insert the message into the database
-    db.execute("INSERT INTO messages (group_id,user_id,content,created_at) VALUES (?,?,?,?)",
-               (gid, user_id, text, datetime.utcnow().isoformat()))
-    db.commit()
+    # Borrow pooled connections (g is not available in SocketIO context)
+    db = pool.checkout_read()
+    try:
+        # Plain tuple rows on this hot path; only the username is needed, and the
+        # join ensures the group exists and the sender is a member
+        cur = db.cursor()
+        cur.row_factory = None
+        row = cur.execute("""
+            SELECT users.username FROM users
+            JOIN group_members ON group_members.user_id = users.id AND group_members.group_id = ?
+            WHERE users.id = ?
+        """, (gid, user_id)).fetchone()
+    finally:
+        pool.checkin_read(db)
+    if not row:
+        return
+    (username,) = row
     
-    # Format the timestamp for display
-    timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M")
+    # Queue the message; flush_messages persists it with the next batch
+    created_at = int(time.time() * 1000)
+    MSG_QUEUE.append((gid, user_id, text, created_at))
     
     # Emit the message to all clients in the room
     emit("message", {
-        "username": user["username"],
+        "username": username,
         "text": text,
-        "created_at": timestamp
+        "created_at": created_at  # UNIX ms; app.js formats it like fmt_ts
     }, room=room)
-    
-    db.close()
 
 # ---------- AI Suggestion ----------
 def offline_recipe(ingredients_list):
@@ -520,11 +876,16 @@ def offline_recipe(ingredients_list):
         "steps": steps
     }
 
+# The model sometimes wraps its JSON in prose or code fences
+_AI_JSON_RE = re.compile(r'\{.*\}', re.S)
+
+def openai_enabled():
+    return bool(os.getenv("OPENAI_API_KEY","")) and OpenAI is not None
+
 def openai_recipe(ingredients_list):
-    api_key = os.getenv("OPENAI_API_KEY","")
-    if not api_key or OpenAI is None:
+    if not openai_enabled():
         return offline_recipe(ingredients_list)
-    client = OpenAI(api_key=api_key)
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
     prompt = (
         "Create a concise recipe using ONLY these ingredients (you may assume pantry basics: salt, pepper, oil):\n"
         f"{', '.join(ingredients_list)}\n"
@@ -537,23 +898,83 @@ def openai_recipe(ingredients_list):
             temperature=0.7
         )
         content = resp.choices[0].message.content
-        import json, re
-        match = re.search(r'\{.*\}', content, re.S)
+        match = _AI_JSON_RE.search(content)
         if match:
-            return json.loads(match.group(0))
+            return orjson.loads(match.group(0))
     except Exception as e:
         pass
     return offline_recipe(ingredients_list)
 
+# OpenAI calls run as background tasks; results are pushed to the "ai_<job_id>" room.
+# Finished results are kept briefly so a client that joins late still gets them.
+# Each job records the user who started it; only that user may join its room.
+# Like the user cache, job state lives in Redis when REDIS_URL is set so any
+# instance can answer ai_join, and falls back to per-process caches otherwise.
+AI_JOB_TTL = 600
+AI_JOB_OWNERS = TTLCache(maxsize=1000, ttl=AI_JOB_TTL)
+AI_RESULTS = TTLCache(maxsize=1000, ttl=AI_JOB_TTL)
+AI_RESULTS_LOCK = threading.Lock()
+
+def _ai_job_get(local, kind, job_id):
+    if redis_client is not None:
+        try:
+            data = redis_client.get(f"ai:{job_id}:{kind}")
+            return json.loads(data) if data else None
+        except RedisError:
+            app.logger.warning("Redis unavailable; using the in-process AI job cache")
+    with AI_RESULTS_LOCK:
+        return local.get(job_id)
+
+def _ai_job_set(local, kind, job_id, value):
+    if redis_client is not None:
+        try:
+            redis_client.setex(f"ai:{job_id}:{kind}", AI_JOB_TTL, json.dumps(value))
+            return
+        except RedisError:
+            app.logger.warning("Redis unavailable; using the in-process AI job cache")
+    with AI_RESULTS_LOCK:
+        local[job_id] = value
+
+def run_openai(job_id, ingredients_list):
+    result = openai_recipe(ingredients_list)
+    _ai_job_set(AI_RESULTS, "result", job_id, result)
+    socketio.emit("ai_done", result, room=f"ai_{job_id}")
+
+@socketio.on("ai_join")
+def on_ai_join(data):
+    user_id = session.get("user_id")
+    job_id = str(data.get("job_id") or "")
+    if not user_id or not job_id:
+        return
+    owner_id = _ai_job_get(AI_JOB_OWNERS, "owner", job_id)
+    if owner_id is None or owner_id != user_id:
+        return
+    # Join before looking up the result so a job finishing in between isn't missed
+    join_room(f"ai_{job_id}")
+    result = _ai_job_get(AI_RESULTS, "result", job_id)
+    if result is not None:
+        emit("ai_done", result)
+
 @app.route("/ai", methods=["GET","POST"])
 @login_required
 def ai_suggest():
     suggestion = None
+    job_id = None
     if request.method == "POST":
         ingredients = request.form["ingredients"]
         ing_list = [s.strip() for s in ingredients.split(",") if s.strip()]
-        suggestion = openai_recipe(ing_list)
-    return render_template("ai.html", suggestion=suggestion)
+        if openai_enabled():
+            job_id = uuid4().hex
+            _ai_job_set(AI_JOB_OWNERS, "owner", job_id, g.user["id"])
+            socketio.start_background_task(run_openai, job_id, ing_list)
+        else:
+            suggestion = offline_recipe(ing_list)
+    return render_template("ai.html", suggestion=suggestion, job_id=job_id)
+
+# Compile every template up front (all filters are registered by now)
+with app.app_context():
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
 
 # ---------- CLI ----------
 @app.cli.command("init-db")
@@ -0,0 +1,13 @@
+# Production server settings, picked up by `gunicorn -c gunicorn.conf.py app:app`.
+import os
+
+worker_class = "eventlet"
+# Always one worker: gunicorn can't route a Socket.IO session back to the worker
+# that owns it, and the chat queue and AI jobs live in process memory. Scale by
+# running more instances behind an nginx ip_hash upstream (see nginx.conf).
+# WEB_CONCURRENCY is deliberately ignored (some hosts set it automatically).
+workers = 1
+# Behind nginx use GUNICORN_BIND=unix:/tmp/flask.sock; otherwise gunicorn
+# binds to $PORT (Render/Heroku) or 127.0.0.1:8000.
+if os.getenv("GUNICORN_BIND"):
+    bind = [os.getenv("GUNICORN_BIND")]
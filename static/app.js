@@ -23,10 +23,13 @@ document.addEventListener("DOMContentLoaded", () => {
       msgInput.focus();
     });
 
+    // created_at arrives as UNIX ms; same UTC "YYYY-MM-DD HH:MM" as the fmt_ts filter
+    const fmtTs = (ms) => new Date(ms).toISOString().slice(0, 16).replace("T", " ");
+
     socket.on("message", (data) => {
       const div = document.createElement("div");
       div.className = "msg fade-in";
-      div.innerHTML = `<span class="who">${data.username}</span> ${data.text} <span class="at">${data.created_at}</span>`;
+      div.innerHTML = `<span class="who">${data.username}</span> ${data.text} <span class="at">${fmtTs(data.created_at)}</span>`;
       chatBox.appendChild(div);
       chatBox.scrollTop = chatBox.scrollHeight;
     });
@@ -34,4 +37,36 @@ document.addEventListener("DOMContentLoaded", () => {
     // Ensure chat box is scrolled to bottom on page load
     chatBox.scrollTop = chatBox.scrollHeight;
   }
+
+  // AI suggestion page: the recipe arrives over Socket.IO when the background job finishes
+  const aiResult = document.getElementById("ai_result");
+  if (aiResult) {
+    const socket = io();
+    socket.emit("ai_join", { job_id: aiResult.dataset.jobId });
+
+    const el = (tag, text, cls) => {
+      const node = document.createElement(tag);
+      if (text !== undefined) node.textContent = text;
+      if (cls) node.className = cls;
+      return node;
+    };
+    const list = (tag, items) => {
+      const node = el(tag);
+      (items || []).forEach((i) => node.appendChild(el("li", i)));
+      return node;
+    };
+
+    socket.on("ai_done", (data) => {
+      aiResult.replaceChildren(
+        el("h3", data.title),
+        el("p", data.summary, "sub"),
+        el("h4", "Ingredients"),
+        list("ul", data.ingredients),
+        el("h4", "Steps"),
+        list("ol", data.steps)
+      );
+      aiResult.classList.add("fade-in");
+      socket.disconnect();
+    });
+  }
 });
\ No newline at end of file